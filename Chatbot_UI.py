@@ -1,10 +1,10 @@
 import streamlit as st
 import threading
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode
 import io
 import streamlit.components.v1 as components
-import time
 import hashlib
 import os
 
@@ -51,6 +51,16 @@ def _get_mic_bytes() -> bytes | None:
         except ModuleNotFoundError:
             return None
 
+# ---------- Shared HTTP session: one keep-alive connection pool per server ----------
+
+@st.cache_resource
+def _http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 # Page config
 st.set_page_config(page_title="RAG Chatbot", layout="wide")
 
@@ -75,6 +85,10 @@ uploaded_files = st.sidebar.file_uploader("Select PDF or DOCX files", type=["pdf
 
 # Configuration for API endpoint
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8005")
+# URL the *browser* uses to stream answer audio (defaults to API_BASE_URL)
+API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", API_BASE_URL)
+
+http = _http_session()
 
 if st.sidebar.button("Index Document(s)"):
     if not uploaded_files:
@@ -84,33 +98,48 @@ if st.sidebar.button("Index Document(s)"):
             ("files", (uf.name, uf, uf.type)) for uf in uploaded_files
         ]
         try:
-            resp = requests.post(f"{API_BASE_URL}/upload/", files=file_tuple)
+            resp = http.post(f"{API_BASE_URL}/upload/", files=file_tuple)
             if resp.ok:
                 task_id = resp.json().get("task_id")
                 st.session_state['messages'] = []
                 progress_bar = st.sidebar.progress(0)
                 progress_text = st.sidebar.empty()
                 pct = 0
-                while pct < 100 and pct >= 0:
-                    try:
-                        p_resp = requests.get(f"{API_BASE_URL}/progress/{task_id}")
-                        if p_resp.ok:
-                            pct = p_resp.json().get("progress", 0)
-                            if pct < 0:
-                                raise RuntimeError("Indexing failed")
+                failure = None
+                # Progress is pushed by the server as server-sent events
+                try:
+                    # Read timeout well above the server's 15 s keep-alive interval
+                    with http.get(
+                        f"{API_BASE_URL}/progress/{task_id}/stream", stream=True, timeout=(5, 60)
+                    ) as p_resp:
+                        p_resp.raise_for_status()
+                        event = "message"
+                        for line in p_resp.iter_lines(decode_unicode=True):
+                            if line.startswith("event:"):
+                                event = line[len("event:"):].strip()
+                                continue
+                            if not line.startswith("data:"):
+                                continue  # blank separators and keep-alive comments
+                            data = line[len("data:"):].strip()
+                            if event == "error":
+                                failure = data
+                                break
+                            event_pct = int(data)
+                            if event_pct < 0:
+                                job = http.get(f"{API_BASE_URL}/jobs/{task_id}").json()
+                                failure = f"Indexing {job.get('status', 'failed')}: {job.get('error') or 'no details'}"
+                                break
+                            pct = event_pct
                             progress_bar.progress(min(pct, 100)/100.0)
                             progress_text.text(f"Indexing progress: {pct}%")
-                            time.sleep(0.5)
-                        else:
-                            break
-                    except Exception:
-                        break
+                except requests.RequestException as e:
+                    failure = f"Lost connection to progress stream: {e}"
                 if pct == 100:
                     progress_text.text("Indexing progress: 100%")
                     st.sidebar.success("Indexing complete ✅")
                 else:
                     progress_text.text(f"Indexing stopped at: {pct}%")
-                    st.sidebar.error("Indexing did not complete.")
+                    st.sidebar.error(failure or "Indexing did not complete.")
             else:
                 st.sidebar.error(f"Error {resp.status_code}: {resp.json().get('detail')}")
         except Exception as e:
@@ -162,7 +191,7 @@ if audio_bytes is not None:
         try:
             with st.spinner("Transcribing audio..."):
                 files = {"audio": ("question.wav", audio_bytes, "audio/wav")}
-                tr_resp = requests.post(f"{API_BASE_URL}/transcribe/", files=files)
+                tr_resp = http.post(f"{API_BASE_URL}/transcribe/", files=files)
                 if tr_resp.ok:
                     transcript = tr_resp.json().get("text", "")
                     st.session_state['transcript_pending'] = transcript
@@ -184,47 +213,41 @@ if st.button("Send"):
         st.warning("Please provide a question (text or record audio).")
         st.stop()
 
-    # ensure we're only sending text; audio already transcribed
-    if 'transcript_pending' in st.session_state or audio_bytes is None:
-        audio_bytes = None
+    # Render user message immediately; the answer streams in below it
+    st.session_state['messages'].append({'role': 'user', 'content': text_query})
+    st.chat_message('user').write(text_query)
 
-    audio_only = bool(audio_bytes and not text_query)
-    with st.spinner("Thinking..."):
+    answer_text = ""
+    answered = False
+    answer_id = None
+    with st.chat_message('assistant'):
         try:
-            if audio_bytes:
-                files = {"audio": ("question.wav", audio_bytes, "audio/wav")}
-                data = {"voice": voice_choice}
-                if text_query:
-                    data["question"] = text_query
-                resp = requests.post(f"{API_BASE_URL}/ask/", files=files, data=data)
-            else:
-                resp = requests.post(f"{API_BASE_URL}/ask/", json={"question": text_query, "voice": voice_choice})
-
-            if resp.ok:
-                resp_json = resp.json()
-                answer_text = resp_json.get("answer")
-                answer_audio_b64 = resp_json.get("answer_audio", "")
-                question_text = resp_json.get("question", text_query or '🔊 Audio question')
-                # Render user message now (text or transcript from backend)
-                final_user_text = question_text
-                st.session_state['messages'].append({'role': 'user', 'content': final_user_text})
-                st.chat_message('user').write(final_user_text)
-            else:
-                answer_text = f"Error {resp.status_code}: {resp.json().get('detail')}"
-                answer_audio_b64 = ""
+            with st.spinner("Thinking..."):
+                resp = http.post(f"{API_BASE_URL}/ask/stream", json={"question": text_query}, stream=True)
+            with resp:
+                if resp.ok:
+                    resp.encoding = "utf-8"
+                    answer_id = resp.headers.get("X-Answer-Id")
+                    answer_text = st.write_stream(
+                        resp.iter_content(chunk_size=None, decode_unicode=True)
+                    )
+                    answered = bool(answer_text)
+                    if not answered:
+                        answer_text = "No answer was returned."
+                        st.write(answer_text)
+                else:
+                    answer_text = f"Error {resp.status_code}: {resp.json().get('detail')}"
+                    st.write(answer_text)
         except Exception as e:
             answer_text = f"Connection error: {e}"
-            answer_audio_b64 = ""
+            st.write(answer_text)
 
-    # Render assistant response
     st.session_state['messages'].append({'role': 'assistant', 'content': answer_text})
-    st.chat_message('assistant').write(answer_text)
 
-    # Play audio answer
-    if answer_audio_b64 and answer_audio_b64.startswith("data:audio"):
-        b64_data = answer_audio_b64.split(",", 1)[1]
-        audio_data = base64.b64decode(b64_data)
-        st.audio(audio_data, format='audio/mp3')
+    # Play audio answer: the browser streams /tts/ and starts playback on the first segment
+    if answered and answer_id:
+        tts_query = urlencode({"voice": voice_choice})
+        st.audio(f"{API_PUBLIC_URL}/tts/{answer_id}?{tts_query}", format='audio/mp3', autoplay=True)
 
     # Clear audio buffer so user must record again next turn
     audio_bytes = None
@@ -1,13 +1,18 @@
+import asyncio
 import os
 import shutil
+import threading
 import time
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form, Request, BackgroundTasks
-from fastapi.responses import ORJSONResponse
+from collections import OrderedDict
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from typing import Any, Union
-from models import UploadResponse, AskResponse
-from embedding_creator import create_pinecone_index
-from chatbot import answer_question
-from audio_utils import transcribe_audio, synthesize_speech
+from models import UploadResponse, AskResponse, JobResponse
+from embedding_creator import open_pinecone_index
+from upload_cache import save_upload
+from job_queue import JobQueue, EXTERNAL_WORKER, LEASE_HELD_EXIT_CODE, start_worker_process
+from chatbot import answer_question, retrieve_context, stream_answer
+from audio_utils import transcribe_audio, synthesize_speech, stream_speech
 import uuid
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -24,46 +29,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global progress dictionary {task_id: percentage}
-TASK_PROGRESS: dict[str, int] = {}
-
 # Utility: remove a directory entirely
 def _remove_directory(path: str):
     """Delete the directory and all its contents if it exists."""
     if os.path.exists(path):
         shutil.rmtree(path)
 
-# Ensure directories are removed on app startup
-@app.on_event("startup")
-async def _startup_cleanup():
-    print("Purging uploads directory on startup …")
-    _remove_directory(UPLOAD_DIR)
-    print("Startup purge completed.")
+# Utility: drop upload folders that no queued/running job still needs
+def _purge_uploads(keep: list[str]):
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    for name in os.listdir(UPLOAD_DIR):
+        if name not in keep:
+            _remove_directory(os.path.join(UPLOAD_DIR, name))
 
+# The index built by `index_job_id` is installed lazily once that job is done.
+# INDEX_LOCK makes "check job, install index" atomic with an upload replacing it.
 app.state.pinecone_index: Any | None = None
-
-# Background task to build index and update progress
-def _index_task(paths: list[str], task_id: str):
-    TASK_PROGRESS[task_id] = 0
-
-    def _cb(pct: int):
-        TASK_PROGRESS[task_id] = pct
-
-    try:
-        app.state.pinecone_index = create_pinecone_index(paths, progress_cb=_cb)
-        TASK_PROGRESS[task_id] = 100
-    except Exception as e:
-        TASK_PROGRESS[task_id] = -1  # indicates failure
-        print(f"[Upload] indexing task {task_id} failed: {e}")
+app.state.index_job_id: str | None = None
+app.state.ingest_worker = None
+app.state.worker_watchdog = None
+INDEX_LOCK = threading.Lock()
+
+# Jobs are executed by a separate worker process; the API only queues them
+JOB_QUEUE = JobQueue()
+WORKER_CHECK_INTERVAL = 15
+
+# Restart a crashed worker process, or report when no worker is running at all
+async def _watch_ingest_worker():
+    while True:
+        await asyncio.sleep(WORKER_CHECK_INTERVAL)
+        proc = app.state.ingest_worker
+        if proc is not None and not proc.is_alive():
+            if proc.exitcode == LEASE_HELD_EXIT_CODE:
+                print("[API] another process owns the ingestion queue; not restarting worker")
+                app.state.ingest_worker = None
+            else:
+                print(f"[API] ingestion worker exited with code {proc.exitcode}; restarting")
+                app.state.ingest_worker = start_worker_process()
+        elif proc is None and not await asyncio.to_thread(JOB_QUEUE.worker_alive):
+            print("[API] WARNING: no ingestion worker heartbeat; queued jobs will not run")
+
+# Purge uploads no longer needed and start the ingestion worker on app startup
+@app.on_event("startup")
+async def _startup_jobs():
+    active = await asyncio.to_thread(JOB_QUEUE.active_ids)
+    app.state.index_job_id = await asyncio.to_thread(JOB_QUEUE.latest_id)
+    print(f"Purging uploads directory on startup (keeping {len(active)} active job(s)) …")
+    await asyncio.to_thread(_purge_uploads, active)
+    print("Startup purge completed.")
+    if not EXTERNAL_WORKER:
+        app.state.ingest_worker = start_worker_process()
+    app.state.worker_watchdog = asyncio.create_task(_watch_ingest_worker())
+
+@app.on_event("shutdown")
+async def _shutdown_jobs():
+    if app.state.worker_watchdog is not None:
+        app.state.worker_watchdog.cancel()
+    # Running jobs are resumed from their checkpoints on next start
+    if app.state.ingest_worker is not None:
+        app.state.ingest_worker.terminate()
+
+# Utility: cancel active jobs and point the API at the job replacing the index
+def _supersede_jobs(new_job_id: str):
+    with INDEX_LOCK:
+        for job_id in JOB_QUEUE.active_ids():
+            JOB_QUEUE.cancel(job_id)
+        app.state.pinecone_index = None
+        app.state.index_job_id = new_job_id
+    _purge_uploads(keep=JOB_QUEUE.active_ids())
+
+# Serialises supersede -> save -> submit so concurrent uploads cannot purge
+# each other's files or leave an older job queued behind a newer one
+UPLOAD_LOCK = asyncio.Lock()
 
 # ─── Upload Endpoint ─────────────────────────────────────
 @app.post("/upload/", response_model=UploadResponse)
-async def upload_files(background_tasks: BackgroundTasks, files: list[UploadFile] = File(...)):
+async def upload_files(files: list[UploadFile] = File(...)):
  
-    # Clean previous uploads and index to free memory
-    _remove_directory(UPLOAD_DIR)
-    app.state.pinecone_index = None
-    
     filenames = [f.filename for f in files]
     print(f"Upload started for {len(files)} file(s): {filenames} at {time.strftime('%H:%M:%S')}")
     upload_start_time = time.time()
@@ -75,48 +118,53 @@ async def upload_files(background_tasks: BackgroundTasks, files: list[UploadFile
             print(f"Invalid file type: {ext}")
             raise HTTPException(400, "Only .pdf and .docx supported")
 
-    # File saving timing
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-    save_start_time = time.time()
-    paths = []
-    for f in files:
-        dest = os.path.join(UPLOAD_DIR, f.filename)
-        with open(dest, "wb") as out:
-            shutil.copyfileobj(f.file, out)
-        paths.append(dest)
-    save_time = time.time() - save_start_time
-    print(f"All files saved in {save_time:.2f} seconds")
-
-    # Kick off background indexing task
     task_id = str(uuid.uuid4())
-    background_tasks.add_task(_index_task, paths, task_id)
+    async with UPLOAD_LOCK:
+        # Supersede previous jobs (they share one Pinecone index) and free their uploads
+        await asyncio.to_thread(_supersede_jobs, task_id)
+
+        # File saving timing
+        job_dir = os.path.join(UPLOAD_DIR, task_id)
+        os.makedirs(job_dir, exist_ok=True)
+
+        # Stream each file to disk off the event loop, hashing as it is written
+        save_start_time = time.time()
+        paths = []
+        content_hashes = {}
+        for f in files:
+            dest = os.path.join(job_dir, f.filename)
+            content_hashes[dest] = await asyncio.to_thread(save_upload, f.file, dest)
+            paths.append(dest)
+        save_time = time.time() - save_start_time
+        print(f"All files saved in {save_time:.2f} seconds")
 
-    print(f"Indexing started in background task {task_id}")
+        # Queue indexing job for the worker
+        await asyncio.to_thread(JOB_QUEUE.submit, paths, task_id, content_hashes)
 
-    return UploadResponse(task_id=task_id, message="Indexing started")
+    print(f"Indexing queued as job {task_id}")
+
+    return UploadResponse(task_id=task_id, message="Indexing queued")
 
 # ─── Dependency to fetch Pinecone index ─────────────────
 def get_pinecone_index():
-    idx = app.state.pinecone_index
+    with INDEX_LOCK:
+        idx = app.state.pinecone_index
+        job_id = app.state.index_job_id
+        if idx is None and job_id is not None:
+            job = JOB_QUEUE.get(job_id)
+            if job is not None and job["status"] == "done":
+                idx = app.state.pinecone_index = open_pinecone_index()
     if idx is None:
         print("No Pinecone index available")
         raise HTTPException(400, "No index available. Upload first.")
     return idx
 
-# ─── Ask Endpoint ────────────────────────────────────────
-@app.post("/ask/", response_model=AskResponse)
-async def ask(
+# ─── Question normalisation ────────────────────────────
+async def _resolve_question(
     request: Request,
-    question: str | None = Form(default=None),
-    audio: Union[UploadFile, str, None] = File(default=None),
-    voice: str = Form(default="alloy"),
-    pinecone_index: Any = Depends(get_pinecone_index),
-):
-    """Handle text or audio question and return both text and audio answer."""
-    print(f"API request received at {time.strftime('%H:%M:%S')}")
-    api_start_time = time.time()
-
+    question: str | None,
+    audio: Union[UploadFile, str, None],
+) -> str:
     # ------------------------------------------------------------------
     # Normalise input -> text
     # Accept either multipart/form-data (question &/or audio) or
@@ -155,6 +203,23 @@ async def ask(
     if isinstance(audio, UploadFile):
         print(f"[API] Received audio file: {audio.filename} ({audio.content_type})")
 
+    return question
+
+# ─── Ask Endpoint ────────────────────────────────────────
+@app.post("/ask/", response_model=AskResponse)
+async def ask(
+    request: Request,
+    question: str | None = Form(default=None),
+    audio: Union[UploadFile, str, None] = File(default=None),
+    voice: str = Form(default="alloy"),
+    pinecone_index: Any = Depends(get_pinecone_index),
+):
+    """Handle text or audio question and return both text and audio answer."""
+    print(f"API request received at {time.strftime('%H:%M:%S')}")
+    api_start_time = time.time()
+
+    question = await _resolve_question(request, question, audio)
+
     # RAG answer
     answer_text = await answer_question(pinecone_index, question)
 
@@ -167,13 +232,160 @@ async def ask(
 
     return AskResponse(question=question, answer=answer_text, answer_audio=answer_audio_b64)
 
+# ─── Answer registry for /tts/ ────────────────────────────
+# Streamed answers are kept briefly so the browser can fetch their audio by id
+ANSWER_TTL = 600
+ANSWER_REGISTRY_SIZE = 256
+_ANSWERS: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+def _register_answer(answer_id: str, text: str):
+    _ANSWERS[answer_id] = (time.time(), text)
+    while len(_ANSWERS) > ANSWER_REGISTRY_SIZE:
+        _ANSWERS.popitem(last=False)
+
+def _lookup_answer(answer_id: str) -> str | None:
+    entry = _ANSWERS.get(answer_id)
+    if entry is None or time.time() - entry[0] > ANSWER_TTL:
+        return None
+    return entry[1]
+
+# ─── Streaming Ask Endpoint ──────────────────────────────
+@app.post("/ask/stream")
+async def ask_stream(
+    request: Request,
+    question: str | None = Form(default=None),
+    audio: Union[UploadFile, str, None] = File(default=None),
+    pinecone_index: Any = Depends(get_pinecone_index),
+):
+    """Stream the text answer token by token.
+
+    The `X-Answer-Id` response header identifies the answer; once the stream
+    ends its audio can be fetched from `/tts/{answer_id}`.
+    """
+    print(f"API stream request received at {time.strftime('%H:%M:%S')}")
+    question = await _resolve_question(request, question, audio)
+
+    # Retrieve before sending headers so failures still surface as errors
+    context = await asyncio.to_thread(retrieve_context, pinecone_index, question)
+
+    answer_id = uuid.uuid4().hex
+
+    async def _tokens():
+        parts = []
+        async for token in stream_answer(question, context):
+            parts.append(token)
+            yield token
+        _register_answer(answer_id, "".join(parts))
+
+    return StreamingResponse(
+        _tokens(),
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Answer-Id": answer_id},
+    )
+
+# ─── Streaming TTS Endpoint ──────────────────────────────
+@app.get("/tts/{answer_id}")
+async def tts(answer_id: str, voice: str = "alloy"):
+    """Stream mp3 audio for a streamed answer so playback starts before synthesis ends."""
+    text = _lookup_answer(answer_id)
+    if not text:
+        raise HTTPException(404, "Unknown or expired answer id")
+    return StreamingResponse(stream_speech(text, voice=voice), media_type="audio/mpeg")
+
 # ─── Progress Endpoint ─────────────────────────────────────
+PROGRESS_PUSH_INTERVAL = 0.25
+PROGRESS_KEEPALIVE_INTERVAL = 15
+PROGRESS_STALL_SECONDS = 300
+PROGRESS_STREAM_MAX_SECONDS = 3600
+
+def _job_progress(job: dict) -> int:
+    """Map a job row to a percentage; -1 on failure, 100 only once the index is live."""
+    if job["status"] in {"failed", "cancelled"}:
+        return -1  # indicates failure
+    if job["status"] == "done":
+        return 100
+    return min(job["progress"], 99)
+
 @app.get("/progress/{task_id}")
 async def progress(task_id: str):
-    pct = TASK_PROGRESS.get(task_id)
-    if pct is None:
+    job = await asyncio.to_thread(JOB_QUEUE.get, task_id)
+    if job is None:
         raise HTTPException(404, "Unknown task id")
-    return {"progress": pct}
+    return {"progress": _job_progress(job)}
+
+@app.get("/progress/{task_id}/stream")
+async def progress_stream(task_id: str):
+    """Push progress as server-sent events until the job finishes."""
+    if await asyncio.to_thread(JOB_QUEUE.get, task_id) is None:
+        raise HTTPException(404, "Unknown task id")
+
+    async def _events():
+        last = None
+        started = last_sent = last_check = time.time()
+        while True:
+            job = await asyncio.to_thread(JOB_QUEUE.get, task_id)
+            pct = _job_progress(job)
+            now = time.time()
+            if pct != last:
+                yield f"data: {pct}\n\n"
+                last, last_sent = pct, now
+            if pct < 0 or pct >= 100:
+                break
+
+            # Give up instead of hanging when the job can no longer make progress
+            reason = None
+            if now - started > PROGRESS_STREAM_MAX_SECONDS:
+                reason = "Progress stream timed out"
+            elif job["status"] == "running" and now - job["updated_at"] > PROGRESS_STALL_SECONDS:
+                reason = f"Indexing made no progress for {PROGRESS_STALL_SECONDS} seconds"
+            elif now - last_check > PROGRESS_KEEPALIVE_INTERVAL:
+                last_check = now
+                if not await asyncio.to_thread(JOB_QUEUE.worker_alive):
+                    reason = "Ingestion worker is not running"
+            if reason:
+                yield f"event: error\ndata: {reason}\n\n"
+                break
+
+            if now - last_sent > PROGRESS_KEEPALIVE_INTERVAL:
+                yield ": keep-alive\n\n"
+                last_sent = now
+            await asyncio.sleep(PROGRESS_PUSH_INTERVAL)
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
+
+# ─── Job Endpoints ─────────────────────────────────────────
+def _job_response(job: dict) -> JobResponse:
+    return JobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        progress=_job_progress(job),
+        cancel_requested=bool(job["cancel_requested"]),
+        error=job["error"],
+    )
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(JOB_QUEUE.get, job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job id")
+    return _job_response(job)
+
+# Utility: cancel a job and drop its uploads once it can no longer run
+def _cancel_job(job_id: str) -> dict:
+    job = JOB_QUEUE.cancel(job_id)
+    if job["status"] == "cancelled":
+        _remove_directory(os.path.join(UPLOAD_DIR, job_id))
+    return job
+
+@app.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    job = await asyncio.to_thread(JOB_QUEUE.get, job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job id")
+    if job["status"] not in {"queued", "running"}:
+        raise HTTPException(409, f"Job already {job['status']}")
+    job = await asyncio.to_thread(_cancel_job, job_id)
+    return _job_response(job)
 
 # ─── Transcribe Endpoint ─────────────────────────────────────
 @app.post("/transcribe/")
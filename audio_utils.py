@@ -3,7 +3,7 @@ import shutil
 import tempfile
 import uuid
 from pathlib import Path
-from typing import Union
+from typing import Iterator, Union
 
 from fastapi import UploadFile
 from dotenv import load_dotenv
@@ -11,6 +11,8 @@ import openai
 
 load_dotenv()
 
+# OpenAI TTS rejects inputs longer than this
+TTS_MAX_CHARS = 4096
 
 
 # Speech-to-Text (OpenAI Whisper)
@@ -70,4 +72,40 @@ async def synthesize_speech(text: str, voice: str = "alloy") -> str:
 
     b64_audio = base64.b64encode(audio_bytes).decode()
   
-    return f"data:audio/mp3;base64,{b64_audio}" 
\ No newline at end of file
+    return f"data:audio/mp3;base64,{b64_audio}"
+
+
+def split_for_tts(text: str, limit: int = TTS_MAX_CHARS) -> list[str]:
+    """Split `text` into segments of at most `limit` chars, preferring sentence breaks."""
+    segments = []
+    text = text.strip()
+    while len(text) > limit:
+        window = text[:limit]
+        cut = max(window.rfind(". "), window.rfind("\n"))
+        if cut <= 0:
+            cut = window.rfind(" ")
+        cut = cut + 1 if cut > 0 else limit
+        segments.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        segments.append(text)
+    return segments
+
+
+def stream_speech(text: str, voice: str = "alloy", chunk_size: int = 4096) -> Iterator[bytes]:
+    """Yield mp3 bytes from OpenAI TTS as soon as each chunk arrives.
+
+    Text longer than the TTS input limit is synthesized segment by segment;
+    the mp3 streams are concatenated.
+    """
+    segments = split_for_tts(text)
+    print(f"[TTS] Streaming {len(text)} characters in {len(segments)} segment(s) with voice='{voice}' using model 'tts-1'")
+
+    for segment in segments:
+        with openai.audio.speech.with_streaming_response.create(
+            model="tts-1",
+            voice=voice,
+            input=segment,
+            response_format="mp3",
+        ) as tts_response:
+            yield from tts_response.iter_bytes(chunk_size)
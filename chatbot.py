@@ -5,7 +5,7 @@ from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from prompts import QA_PROMPT_TEMPLATE
 from dotenv import load_dotenv
-from typing import Any
+from typing import Any, AsyncIterator
 from langchain_openai import OpenAIEmbeddings
 load_dotenv()
 
@@ -26,10 +26,7 @@ chain = prompt | llm | StrOutputParser()
 openai_api_key = os.getenv("OPENAI_API_KEY")
 embedder = OpenAIEmbeddings(model="text-embedding-3-small", openai_api_key=openai_api_key)
 
-async def answer_question(pinecone_index: Any, question: str, k: int = 3) -> str:
-    print(f"Starting question processing: '{question[:50]}...' at {time.strftime('%H:%M:%S')}")
-    total_start_time = time.time()
-    
+def retrieve_context(pinecone_index: Any, question: str, k: int = 3) -> str:
     # Document retrieval timing
     print(f"Retrieving top {k} documents...")
     retrieval_start_time = time.time()
@@ -54,6 +51,13 @@ async def answer_question(pinecone_index: Any, question: str, k: int = 3) -> str
     context = "\n\n".join(context_chunks)
     context_time = time.time() - context_start_time
     print(f"Context prepared in {context_time:.3f} seconds (length: {len(context)} chars)")
+    return context
+
+async def answer_question(pinecone_index: Any, question: str, k: int = 3) -> str:
+    print(f"Starting question processing: '{question[:50]}...' at {time.strftime('%H:%M:%S')}")
+    total_start_time = time.time()
+
+    context = retrieve_context(pinecone_index, question, k)
     
     # LLM inference timing
     print("Generating answer with LLM...")
@@ -70,3 +74,19 @@ async def answer_question(pinecone_index: Any, question: str, k: int = 3) -> str
     print("-" * 60)
     
     return result
+
+async def stream_answer(question: str, context: str) -> AsyncIterator[str]:
+    """Yield answer tokens for an already retrieved `context` as the LLM produces them."""
+    print(f"Streaming answer from LLM for: '{question[:50]}...' at {time.strftime('%H:%M:%S')}")
+    total_start_time = time.time()
+
+    first_token_time = None
+    async for token in chain.astream({"question": question, "context": context}):
+        if first_token_time is None:
+            first_token_time = time.time() - total_start_time
+            print(f"First token after {first_token_time:.2f} seconds")
+        yield token
+
+    total_time = time.time() - total_start_time
+    print(f"Streamed answer completed in {total_time:.2f} seconds")
+    print("-" * 60)
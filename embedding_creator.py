@@ -7,6 +7,7 @@ from langchain_openai import OpenAIEmbeddings
 from langchain.docstore.document import Document
 from pinecone import Pinecone, ServerlessSpec
 import concurrent.futures, itertools
+from upload_cache import cached_pages
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBEDDING_MODEL = "text-embedding-3-small"
@@ -14,29 +15,61 @@ CHUNK_SIZE      = 1500
 CHUNK_OVERLAP   = 80
 MAX_INPUT_TOKENS = 300000
 
-def load_text(path: str) -> str:
+class IndexingCancelled(Exception):
+    """Raised when an indexing run is cancelled between batches."""
+
+def _extract_pages(path: str) -> List[str]:
     ext = os.path.splitext(path)[1].lower()
     if ext == ".pdf":
         pdf = fitz.open(path)
-        return "\n".join(page.get_text() for page in pdf)
+        return [page.get_text() for page in pdf]
     elif ext == ".docx":
         doc = DocxDocument(path)
-        return "\n".join(p.text for p in doc.paragraphs)
+        return [p.text for p in doc.paragraphs]
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
+def load_text(path: str, content_hash: str | None = None) -> str:
+    """Return the text of `path`, reusing cached pages when `content_hash` is known."""
+    if content_hash is None:
+        return "\n".join(_extract_pages(path))
+    ext = os.path.splitext(path)[1].lower()
+    return "\n".join(cached_pages(content_hash, ext, lambda: _extract_pages(path)))
+
+def open_pinecone_index(index_name: str | None = None) -> Any:
+    """Return a handle to an existing, already populated Pinecone index."""
+    pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    index_name = index_name or os.getenv("PINECONE_INDEX_NAME", "rag-agent-index")
+    return pc.Index(index_name)
+
 def create_pinecone_index(
     paths: List[str],
     index_name: str | None = None,
     progress_cb = None,
+    completed_batches: set[int] | None = None,
+    checkpoint_cb = None,
+    should_cancel = None,
+    content_hashes: dict[str, str] | None = None,
 ) -> Any:
-   
+    """Embed `paths` into Pinecone.
+
+    Batches listed in `completed_batches` are skipped and the existing index is
+    reused, so an interrupted run can resume. `checkpoint_cb(batch_no)` is
+    called after each batch is upserted; `should_cancel()` is checked before
+    each batch and aborts the run with `IndexingCancelled`. `content_hashes`
+    maps paths to their SHA-256 so already-parsed files skip text extraction.
+    """
+
+    def _check_cancel():
+        if should_cancel and should_cancel():
+            raise IndexingCancelled()
+
     splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
         chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
     )
     all_chunks = []
     for p in paths:
-        raw = load_text(p)
+        raw = load_text(p, (content_hashes or {}).get(p))
         docs = [Document(page_content=raw, metadata={"source": os.path.basename(p)})]
         chunks = splitter.split_documents(docs)
         all_chunks.extend(chunks)
@@ -52,20 +85,29 @@ def create_pinecone_index(
 
     index_name = os.getenv("PINECONE_INDEX_NAME", "rag-agent-index")
 
-    # Wipe previous index 
-    if pc.has_index(index_name):
-        pc.delete_index(index_name)
+    completed = set(completed_batches or ())
+    _check_cancel()
+
+    if completed and pc.has_index(index_name):
+        # Resume: keep vectors upserted before the interruption
+        print(f"[EmbeddingCreator] resuming, {len(completed)} batch(es) already indexed")
+    else:
+        completed = set()
 
-    # Serverless spec parameters
-    cloud = os.getenv("PINECONE_CLOUD", "aws")
-    region = os.getenv("PINECONE_REGION", "us-east-1")
+        # Wipe previous index 
+        if pc.has_index(index_name):
+            pc.delete_index(index_name)
 
-    pc.create_index(
-        name=index_name,
-        dimension=1536,  
-        metric="cosine",
-        spec=ServerlessSpec(cloud=cloud, region=region),
-    )
+        # Serverless spec parameters
+        cloud = os.getenv("PINECONE_CLOUD", "aws")
+        region = os.getenv("PINECONE_REGION", "us-east-1")
+
+        pc.create_index(
+            name=index_name,
+            dimension=1536,  
+            metric="cosine",
+            spec=ServerlessSpec(cloud=cloud, region=region),
+        )
 
     index = pc.Index(index_name)
 
@@ -73,7 +115,8 @@ def create_pinecone_index(
     batches = [all_chunks[i : i + batch_size] for i in range(0, len(all_chunks), batch_size)]
 
     def process_batch(batch_tuple):
-        idx_offset, batch = batch_tuple
+        batch_no, idx_offset, batch = batch_tuple
+        _check_cancel()
         texts = [c.page_content for c in batch]
         metas = [c.metadata for c in batch]
         embeddings = embedder.embed_documents(texts)
@@ -86,11 +129,14 @@ def create_pinecone_index(
             for j in range(len(texts))
         ]
         index.upsert(records)
+        if checkpoint_cb:
+            checkpoint_cb(batch_no)
         return len(batch)
 
-    processed = 0
+    pending = [(i, i*batch_size, b) for i, b in enumerate(batches) if i not in completed]
+    processed = sum(len(b) for i, b in enumerate(batches) if i in completed)
     with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        for count in executor.map(process_batch, [(i*batch_size, b) for i, b in enumerate(batches)]):
+        for count in executor.map(process_batch, pending):
             processed += count
             if progress_cb:
                 pct = 5 + int(90 * processed / total_chunks)
@@ -0,0 +1,427 @@
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "jobs.db")
+# Set when the worker is started separately with `python job_queue.py`
+EXTERNAL_WORKER = os.getenv("INGEST_EXTERNAL_WORKER", "").lower() in {"1", "true", "yes"}
+POLL_INTERVAL = 1.0
+
+# Only one worker process may own the queue; it proves liveness with a heartbeat
+HEARTBEAT_INTERVAL = 5.0
+WORKER_LEASE_SECONDS = 30.0
+LEASE_HELD_EXIT_CODE = 3
+
+ACTIVE_STATUSES = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id               TEXT PRIMARY KEY,
+    status           TEXT NOT NULL,
+    progress         INTEGER NOT NULL DEFAULT 0,
+    paths            TEXT NOT NULL,
+    content_hashes   TEXT,
+    error            TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at       REAL NOT NULL,
+    updated_at       REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    job_id   TEXT NOT NULL,
+    batch_no INTEGER NOT NULL,
+    PRIMARY KEY (job_id, batch_no)
+);
+CREATE TABLE IF NOT EXISTS worker_lease (
+    id        INTEGER PRIMARY KEY CHECK (id = 1),
+    owner     TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+"""
+
+
+class JobContext:
+    """Handle given to a job runner for progress, checkpoints and cancellation."""
+
+    def __init__(
+        self,
+        queue: "JobQueue",
+        job_id: str,
+        paths: list[str],
+        completed_batches: set[int],
+        content_hashes: dict[str, str] | None = None,
+    ):
+        self.queue = queue
+        self.job_id = job_id
+        self.paths = paths
+        self.content_hashes = content_hashes or {}
+        self.completed_batches = completed_batches
+
+    def set_progress(self, pct: int):
+        self.queue._update(self.job_id, progress=pct)
+
+    def checkpoint(self, batch_no: int):
+        self.queue._checkpoint(self.job_id, batch_no)
+
+    def is_cancelled(self) -> bool:
+        return self.queue._cancel_requested(self.job_id)
+
+
+def run_ingest(ctx: JobContext):
+    """Default runner: embed the job's files into Pinecone."""
+    from embedding_creator import create_pinecone_index
+
+    try:
+        create_pinecone_index(
+            ctx.paths,
+            progress_cb=ctx.set_progress,
+            completed_batches=ctx.completed_batches,
+            checkpoint_cb=ctx.checkpoint,
+            should_cancel=ctx.is_cancelled,
+            content_hashes=ctx.content_hashes,
+        )
+    finally:
+        # Files are only kept to resume after a crash; drop them once the run ends
+        _remove_job_uploads(ctx)
+
+
+def _remove_job_uploads(ctx: JobContext):
+    for folder in {os.path.dirname(p) for p in ctx.paths}:
+        if os.path.basename(folder) == ctx.job_id:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+class JobQueue:
+    """SQLite-backed ingestion queue drained by a single worker thread.
+
+    The API only submits, inspects and cancels jobs; the worker runs in a
+    separate process (see :func:`serve`) so indexing does not share the
+    API's CPU and GIL. Ingestion is exclusive: every job rebuilds the same
+    Pinecone index, so a job is only claimed once no other job is running.
+    Jobs and their per-batch checkpoints survive a restart: any job left
+    ``running`` is put back in the queue by :meth:`recover` and resumes from
+    the batches it had already checkpointed.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[JobContext], Any] = run_ingest,
+        db_path: str = JOB_DB_PATH,
+    ):
+        self._runner = runner
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self._db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ─── Public API ────────────────────────────────────────
+    def submit(
+        self,
+        paths: list[str],
+        job_id: str | None = None,
+        content_hashes: dict[str, str] | None = None,
+    ) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, progress, paths, content_hashes, created_at, updated_at) "
+                "VALUES (?, 'queued', 0, ?, ?, ?, ?)",
+                (job_id, json.dumps(paths), json.dumps(content_hashes or {}), now, now),
+            )
+        self._wakeup.set()
+        print(f"[JobQueue] job {job_id} queued with {len(paths)} file(s)")
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def latest_id(self) -> str | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT id FROM jobs ORDER BY created_at DESC LIMIT 1").fetchone()
+        return row["id"] if row else None
+
+    def active_ids(self) -> list[str]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+    def cancel(self, job_id: str) -> dict | None:
+        """Cancel a job. Queued jobs stop immediately, running ones at the next batch."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            # Conditional updates: a worker in another process may finish the job concurrently
+            if row["status"] == "queued":
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, updated_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (time.time(), job_id),
+                )
+                conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+            elif row["status"] == "running":
+                conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1, updated_at = ? "
+                    "WHERE id = ? AND status = 'running'",
+                    (time.time(), job_id),
+                )
+        print(f"[JobQueue] cancellation requested for job {job_id}")
+        return self.get(job_id)
+
+    def recover(self) -> list[str]:
+        """Re-queue jobs interrupted by a previous shutdown; return all active job ids.
+
+        Only call this while holding the worker lease, or it would re-queue
+        jobs another worker process is still running.
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'",
+                (time.time(),),
+            )
+            if cur.rowcount:
+                print(f"[JobQueue] re-queued {cur.rowcount} interrupted job(s)")
+        return self.active_ids()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._worker, name="ingest-worker", daemon=True)
+        self._thread.start()
+        print("[JobQueue] worker started")
+
+    def stop(self):
+        """Stop picking up new jobs. Jobs still running are resumed on next start."""
+        self._stop.set()
+        self._wakeup.set()
+        self._thread = None
+
+    # ─── Worker lease ──────────────────────────────────────
+    def acquire_lease(self, owner: str) -> bool:
+        """Take the worker lease unless another live worker holds it."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT owner, heartbeat FROM worker_lease WHERE id = 1").fetchone()
+            now = time.time()
+            if row and row["owner"] != owner and now - row["heartbeat"] < WORKER_LEASE_SECONDS:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_lease (id, owner, heartbeat) VALUES (1, ?, ?)",
+                (owner, now),
+            )
+        return True
+
+    def renew_lease(self, owner: str) -> bool:
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE worker_lease SET heartbeat = ? WHERE id = 1 AND owner = ?",
+                (time.time(), owner),
+            )
+        return cur.rowcount == 1
+
+    def release_lease(self, owner: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM worker_lease WHERE id = 1 AND owner = ?", (owner,))
+
+    def worker_alive(self) -> bool:
+        """Whether some worker process has sent a heartbeat recently."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT heartbeat FROM worker_lease WHERE id = 1").fetchone()
+        return bool(row) and time.time() - row["heartbeat"] < WORKER_LEASE_SECONDS
+
+    # ─── Worker internals ──────────────────────────────────
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def _checkpoint(self, job_id: str, batch_no: int):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO checkpoints (job_id, batch_no) VALUES (?, ?)",
+                (job_id, batch_no),
+            )
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def _claim_next(self) -> JobContext | None:
+        with self._lock, self._connect() as conn:
+            # Write lock for the whole claim, so other processes cannot interleave
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM jobs WHERE status = 'running' LIMIT 1").fetchone():
+                return None
+            row = conn.execute(
+                "SELECT id, paths, content_hashes FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), row["id"]),
+            )
+            if cur.rowcount != 1:
+                return None
+            done = conn.execute(
+                "SELECT batch_no FROM checkpoints WHERE job_id = ?", (row["id"],)
+            ).fetchall()
+        return JobContext(
+            self,
+            row["id"],
+            json.loads(row["paths"]),
+            {r["batch_no"] for r in done},
+            json.loads(row["content_hashes"] or "{}"),
+        )
+
+    def _finish(self, job_id: str, status: str, **fields):
+        self._update(job_id, status=status, **fields)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+    def _finish_done(self, job_id: str) -> bool:
+        """Mark a job done unless cancellation was requested; return whether it was."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'done', progress = 100, updated_at = ? "
+                "WHERE id = ? AND cancel_requested = 0",
+                (time.time(), job_id),
+            )
+        if not cur.rowcount:
+            return False
+        with self._connect() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+        return True
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                ctx = self._claim_next()
+            except Exception as e:
+                print(f"[JobQueue] could not claim a job: {e}")
+                ctx = None
+            if ctx is None:
+                self._wakeup.wait(timeout=POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            self._run(ctx)
+
+    def _run(self, ctx: JobContext):
+        resumed = f" (resuming after {len(ctx.completed_batches)} batch(es))" if ctx.completed_batches else ""
+        print(f"[JobQueue] job {ctx.job_id} started{resumed}")
+        error = None
+        try:
+            self._runner(ctx)
+        except Exception as e:
+            error = e
+
+        # Retry, so a transient "database is locked" cannot leave the job running forever
+        while not self._stop.is_set():
+            try:
+                self._record_outcome(ctx, error)
+                return
+            except Exception as e:
+                print(f"[JobQueue] could not record outcome of job {ctx.job_id}: {e}; retrying")
+                self._stop.wait(POLL_INTERVAL)
+
+    def _record_outcome(self, ctx: JobContext, error: Exception | None):
+        if error is None and self._finish_done(ctx.job_id):
+            print(f"[JobQueue] job {ctx.job_id} completed")
+        elif ctx.is_cancelled():
+            # Includes jobs cancelled while their last batches were in flight
+            self._finish(ctx.job_id, "cancelled")
+            print(f"[JobQueue] job {ctx.job_id} cancelled")
+        else:
+            self._finish(ctx.job_id, "failed", error=str(error))
+            print(f"[JobQueue] job {ctx.job_id} failed: {error}")
+
+
+# ─── Worker process ────────────────────────────────────────
+def _exit_on_sigterm(signum, frame):
+    sys.exit(0)
+
+
+def serve(db_path: str = JOB_DB_PATH) -> int:
+    """Run the ingestion worker in the current process until interrupted.
+
+    Returns ``LEASE_HELD_EXIT_CODE`` without running any job if another
+    worker process already owns the queue.
+    """
+    queue = JobQueue(db_path=db_path)
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    # A crashed worker's lease expires after WORKER_LEASE_SECONDS
+    deadline = time.time() + WORKER_LEASE_SECONDS + HEARTBEAT_INTERVAL
+    while not queue.acquire_lease(owner):
+        if time.time() >= deadline:
+            print("[JobQueue] another worker process owns the queue; exiting")
+            return LEASE_HELD_EXIT_CODE
+        time.sleep(HEARTBEAT_INTERVAL)
+
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        queue.recover()
+        queue.start()
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                if not queue.renew_lease(owner):
+                    print("[JobQueue] worker lease lost to another process; exiting")
+                    return LEASE_HELD_EXIT_CODE
+            except sqlite3.Error as e:
+                print(f"[JobQueue] heartbeat failed: {e}")
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        queue.stop()
+        try:
+            queue.release_lease(owner)
+        except sqlite3.Error:
+            pass
+
+
+def _serve_process():
+    sys.exit(serve())
+
+
+def start_worker_process() -> multiprocessing.Process:
+    """Spawn :func:`serve` in a child process, isolated from the API's event loop."""
+    proc = multiprocessing.get_context("spawn").Process(target=_serve_process, name="ingest-worker", daemon=True)
+    proc.start()
+    print(f"[JobQueue] worker process started (pid {proc.pid})")
+    return proc
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    sys.exit(serve())
@@ -4,6 +4,13 @@ class UploadResponse(BaseModel):
     task_id: str
     message: str
 
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    progress: int
+    cancel_requested: bool
+    error: str | None = None
+
 class AskRequest(BaseModel):
     question: str
 
@@ -0,0 +1,172 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import job_queue
+from job_queue import JobQueue
+
+
+def _wait_for_status(queue: JobQueue, job_id: str, statuses: set[str], timeout: float = 5.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} stuck in {queue.get(job_id)['status']}")
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp.name, "jobs.db")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_resume_skips_checkpointed_batches(self):
+        seen = []
+
+        def runner(ctx):
+            for batch_no in range(4):
+                if batch_no not in ctx.completed_batches:
+                    seen.append(batch_no)
+                    ctx.checkpoint(batch_no)
+
+        queue = JobQueue(runner, db_path=self.db_path)
+        queue.submit(["a.pdf"], job_id="job")
+
+        # Simulate a process that died after checkpointing two batches
+        ctx = queue._claim_next()
+        ctx.checkpoint(0)
+        ctx.checkpoint(1)
+
+        restarted = JobQueue(runner, db_path=self.db_path)
+        self.assertEqual(restarted.recover(), ["job"])
+        restarted.start()
+        try:
+            job = _wait_for_status(restarted, "job", {"done"})
+        finally:
+            restarted.stop()
+        self.assertEqual(seen, [2, 3])
+        self.assertEqual(job["progress"], 100)
+
+    def test_cancel_queued_job(self):
+        queue = JobQueue(lambda ctx: None, db_path=self.db_path)
+        queue.submit(["a.pdf"], job_id="job")
+        self.assertEqual(queue.cancel("job")["status"], "cancelled")
+        self.assertEqual(queue.active_ids(), [])
+
+    def test_cancel_running_job_that_raises(self):
+        started = threading.Event()
+
+        def runner(ctx):
+            started.set()
+            while not ctx.is_cancelled():
+                time.sleep(0.01)
+            raise RuntimeError("cancelled")
+
+        queue = JobQueue(runner, db_path=self.db_path)
+        queue.submit(["a.pdf"], job_id="job")
+        queue.start()
+        try:
+            self.assertTrue(started.wait(5))
+            queue.cancel("job")
+            job = _wait_for_status(queue, "job", {"cancelled", "failed"})
+        finally:
+            queue.stop()
+        self.assertEqual(job["status"], "cancelled")
+
+    def test_cancel_during_last_batch_is_not_done(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def runner(ctx):
+            # Returns normally even though cancellation arrives mid-run
+            started.set()
+            release.wait(5)
+
+        queue = JobQueue(runner, db_path=self.db_path)
+        queue.submit(["a.pdf"], job_id="job")
+        queue.start()
+        try:
+            self.assertTrue(started.wait(5))
+            self.assertEqual(queue.cancel("job")["status"], "running")
+            release.set()
+            job = _wait_for_status(queue, "job", {"cancelled", "done"})
+        finally:
+            queue.stop()
+        self.assertEqual(job["status"], "cancelled")
+
+    def test_recover_requeues_running_jobs(self):
+        queue = JobQueue(lambda ctx: None, db_path=self.db_path)
+        queue.submit(["a.pdf"], job_id="job")
+        queue._claim_next()
+        self.assertEqual(queue.get("job")["status"], "running")
+        self.assertEqual(queue.recover(), ["job"])
+        self.assertEqual(queue.get("job")["status"], "queued")
+
+    def test_claim_is_exclusive_across_queues(self):
+        first = JobQueue(lambda ctx: None, db_path=self.db_path)
+        second = JobQueue(lambda ctx: None, db_path=self.db_path)
+        first.submit(["a.pdf"], job_id="a")
+        first.submit(["b.pdf"], job_id="b")
+
+        self.assertEqual(first._claim_next().job_id, "a")
+        # Another process must neither re-claim "a" nor start "b" beside it
+        self.assertIsNone(second._claim_next())
+        first._finish("a", "done")
+        self.assertEqual(second._claim_next().job_id, "b")
+
+    def test_second_worker_cannot_take_live_lease(self):
+        queue = JobQueue(lambda ctx: None, db_path=self.db_path)
+        self.assertFalse(queue.worker_alive())
+        self.assertTrue(queue.acquire_lease("one"))
+        self.assertFalse(queue.acquire_lease("two"))
+        self.assertTrue(queue.worker_alive())
+        queue.release_lease("one")
+        self.assertTrue(queue.acquire_lease("two"))
+        self.assertFalse(queue.renew_lease("one"))
+
+    def test_stale_lease_is_taken_over(self):
+        queue = JobQueue(lambda ctx: None, db_path=self.db_path)
+        self.assertTrue(queue.acquire_lease("dead"))
+        with queue._connect() as conn:
+            conn.execute("UPDATE worker_lease SET heartbeat = ?", (time.time() - job_queue.WORKER_LEASE_SECONDS - 1,))
+        self.assertFalse(queue.worker_alive())
+        self.assertTrue(queue.acquire_lease("fresh"))
+
+    def test_worker_survives_database_errors(self):
+        queue = JobQueue(lambda ctx: None, db_path=self.db_path)
+        claim, finish = queue._claim_next, queue._finish_done
+        failures = {"claim": 1, "finish": 1}
+
+        def flaky_claim():
+            if failures["claim"]:
+                failures["claim"] -= 1
+                raise RuntimeError("database is locked")
+            return claim()
+
+        def flaky_finish(job_id):
+            if failures["finish"]:
+                failures["finish"] -= 1
+                raise RuntimeError("database is locked")
+            return finish(job_id)
+
+        queue._claim_next, queue._finish_done = flaky_claim, flaky_finish
+        queue.submit(["a.pdf"], job_id="job")
+        queue.start()
+        try:
+            job = _wait_for_status(queue, "job", {"done", "failed"})
+        finally:
+            queue.stop()
+        self.assertEqual(job["status"], "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import upload_cache
+
+
+class SaveUploadTest(unittest.TestCase):
+    def test_chunked_copy_matches_sha256(self):
+        data = os.urandom(10_000)
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = os.path.join(tmp, "doc.pdf")
+            digest = upload_cache.save_upload(io.BytesIO(data), dest, chunk_size=1024)
+            with open(dest, "rb") as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+
+    def test_empty_upload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dest = os.path.join(tmp, "empty.docx")
+            digest = upload_cache.save_upload(io.BytesIO(b""), dest)
+            self.assertEqual(os.path.getsize(dest), 0)
+        self.assertEqual(digest, hashlib.sha256(b"").hexdigest())
+
+
+class CachedPagesTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self._tmp.name, "cache")
+        patcher = mock.patch.object(upload_cache, "TEXT_CACHE_DIR", self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _extract_pages(self):
+        self.calls += 1
+        return ["page one", "page two"]
+
+    def _entry(self, content_hash: str, ext: str = ".pdf") -> str:
+        return os.path.join(self.cache_dir, f"{content_hash}{ext}.json")
+
+    def test_miss_then_hit(self):
+        first = upload_cache.cached_pages("abc", ".pdf", self._extract_pages)
+        second = upload_cache.cached_pages("abc", ".pdf", self._extract_pages)
+        self.assertEqual(first, ["page one", "page two"])
+        self.assertEqual(second, first)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(os.path.exists(self._entry("abc")))
+
+    def test_corrupt_entry_is_reparsed_and_rewritten(self):
+        os.makedirs(self.cache_dir)
+        for content in ("{not json", '{"pages": 1}', "[1, 2]"):
+            with open(self._entry("abc"), "w", encoding="utf-8") as f:
+                f.write(content)
+            pages = upload_cache.cached_pages("abc", ".pdf", self._extract_pages)
+            self.assertEqual(pages, ["page one", "page two"])
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(upload_cache.cached_pages("abc", ".pdf", self._extract_pages), pages)
+        self.assertEqual(self.calls, 3)
+
+    def test_hit_survives_failing_utime(self):
+        upload_cache.cached_pages("abc", ".pdf", self._extract_pages)
+        with mock.patch.object(upload_cache.os, "utime", side_effect=PermissionError("read-only")):
+            upload_cache.cached_pages("abc", ".pdf", self._extract_pages)
+        self.assertEqual(self.calls, 1)
+
+    def test_unwritable_cache_falls_back_without_leftovers(self):
+        with mock.patch.object(upload_cache.os, "replace", side_effect=OSError("disk full")):
+            pages = upload_cache.cached_pages("abc", ".pdf", self._extract_pages)
+        self.assertEqual(pages, ["page one", "page two"])
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_lru_eviction_respects_max_bytes(self):
+        # Each entry is 24 bytes, so the cap holds two of them
+        with mock.patch.object(upload_cache, "TEXT_CACHE_MAX_BYTES", 60):
+            now = time.time()
+            upload_cache.cached_pages("a", ".pdf", self._extract_pages)
+            os.utime(self._entry("a"), (now - 20, now - 20))
+            upload_cache.cached_pages("b", ".pdf", self._extract_pages)
+            os.utime(self._entry("b"), (now - 10, now - 10))
+            # A cache hit refreshes "a", so "b" becomes the least recently used entry
+            upload_cache.cached_pages("a", ".pdf", self._extract_pages)
+            upload_cache.cached_pages("c", ".pdf", self._extract_pages)
+
+        remaining = sorted(os.listdir(self.cache_dir))
+        self.assertEqual(remaining, ["a.pdf.json", "c.pdf.json"])
+        total = sum(os.path.getsize(os.path.join(self.cache_dir, name)) for name in remaining)
+        self.assertLessEqual(total, 60)
+
+    def test_prune_ignores_entries_removed_concurrently(self):
+        entry = mock.Mock(path=self._entry("gone"))
+        entry.name = "gone.pdf.json"
+        entry.stat.side_effect = FileNotFoundError(entry.path)
+        with mock.patch.object(upload_cache.os, "scandir") as scandir:
+            scandir.return_value.__enter__.return_value = iter([entry])
+            upload_cache._prune()  # must not raise
+
+
+if __name__ == "__main__":
+    unittest.main()
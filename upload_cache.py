@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import BinaryIO, Callable, List
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", ".text_cache")
+TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+# ─── Uploads ──────────────────────────────────────────────
+def save_upload(src: BinaryIO, dest: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    """Copy `src` to `dest` in chunks, returning the SHA-256 of the content."""
+    digest = hashlib.sha256()
+    with open(dest, "wb") as out:
+        while chunk := src.read(chunk_size):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+# ─── Extracted text cache ─────────────────────────────────
+def cached_pages(content_hash: str, ext: str, extract: Callable[[], List[str]]) -> List[str]:
+    """Return the page texts for a file, calling `extract` only on a cache miss.
+
+    The cache is only an optimisation: unreadable, corrupt or unwritable
+    entries fall back to `extract` and never fail the caller.
+    """
+    cache_path = os.path.join(TEXT_CACHE_DIR, f"{content_hash}{ext}.json")
+    pages = _read_entry(cache_path)
+    if pages is not None:
+        print(f"[UploadCache] text cache hit for {content_hash[:12]}{ext}")
+        return pages
+
+    pages = extract()
+    _write_entry(cache_path, pages)
+    return pages
+
+
+def _read_entry(cache_path: str) -> List[str] | None:
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            pages = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(pages, list) or not all(isinstance(p, str) for p in pages):
+        return None
+    try:
+        os.utime(cache_path)  # mark as recently used for eviction
+    except OSError:
+        pass
+    return pages
+
+
+def _write_entry(cache_path: str, pages: List[str]):
+    tmp_path = None
+    try:
+        os.makedirs(TEXT_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=TEXT_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(pages, f)
+        os.replace(tmp_path, cache_path)
+        tmp_path = None
+    except OSError as e:
+        print(f"[UploadCache] could not write text cache {cache_path}: {e}")
+        return
+    finally:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    _prune()
+
+
+def _prune():
+    """Evict least recently used entries until the cache fits TEXT_CACHE_MAX_BYTES."""
+    entries = []
+    try:
+        with os.scandir(TEXT_CACHE_DIR) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # removed by another writer
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    except OSError as e:
+        print(f"[UploadCache] could not scan text cache: {e}")
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total <= TEXT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[UploadCache] could not evict {entry_path}: {e}")
+            continue
+        total -= size